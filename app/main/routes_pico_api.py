@@ -3,6 +3,8 @@ import os
 import uuid
 import threading
 import logging
+import weakref
+from collections import OrderedDict
 from datetime import datetime
 import flask as _flask
 from webargs import fields
@@ -37,17 +39,48 @@ def _log_warning(msg: str):
         # no app context; use module-level logger (which tests patch)
         current_app.logger.warning(msg)
 
-# Thread-safe locks for session management
-session_locks = {}
-session_locks_lock = threading.Lock()
+# Thread-safe locks for session management, striped so that first-seen UIDs
+# only contend on the allocation mutex of their own shard. Each shard keeps
+# strong references to its recently used locks in an LRU bounded to
+# _MAX_LOCKS / _SESSION_LOCK_SHARDS entries, plus a weak map of every lock
+# still alive. A lock evicted from the LRU while a request holds it is found
+# again through the weak map, so a UID never has two locks at once, and it is
+# reclaimed once the last request drops it.
+_SESSION_LOCK_SHARDS = 16  # power of two
+_MAX_LOCKS = 4096
+_MAX_LOCKS_PER_SHARD = _MAX_LOCKS // _SESSION_LOCK_SHARDS
+session_lock_shards = [(OrderedDict(), weakref.WeakValueDictionary(), threading.Lock())
+                       for _ in range(_SESSION_LOCK_SHARDS)]
+
+
+def session_lock_shard(uid):
+    """Return the (recent, live, mutex) shard that owns a device UID"""
+    return session_lock_shards[hash(uid) & (_SESSION_LOCK_SHARDS - 1)]
+
 
 def get_session_lock(uid):
     """Get or create a thread-safe lock for a specific device UID"""
+    recent_locks, live_locks, session_locks_lock = session_lock_shard(uid)
+    # Fast path: a recently used lock is an atomic dict read and LRU touch, no mutex
+    lock = recent_locks.get(uid)
+    if lock is not None:
+        try:
+            recent_locks.move_to_end(uid)
+            return lock
+        except KeyError:
+            pass  # evicted since the read; resolve it under the mutex
     with session_locks_lock:
-        if uid not in session_locks:
-            session_locks[uid] = threading.Lock()
-        return session_locks[uid]
-
+        # Re-check under the mutex so racing first callers still share one lock
+        lock = recent_locks.get(uid)
+        if lock is None:
+            # Evicted from the LRU but possibly still held by a request
+            lock = live_locks.get(uid)
+            if lock is None:
+                lock = live_locks[uid] = threading.Lock()
+            recent_locks[uid] = lock
+            if len(recent_locks) > _MAX_LOCKS_PER_SHARD:
+                recent_locks.popitem(last=False)
+        return lock
 
 # Register: /API/pico/register?uid={UID}
 # Response: '#{0}#\r\n' where {0} : T = Registered, F = Not Registered
@@ -110,6 +143,11 @@ get_firmware_args = {
 }
 
 
+def _preview_uid(uid):
+    """Sanitized form of a device UID for log output, to avoid information disclosure"""
+    return f"{uid[:8]}..." if len(uid) > 8 else "<short-uid>"
+
+
 def process_get_firmware(args):
     """Core implementation for getFirmware that accepts an args dict.
     Exposed as a plain function so unit tests can call it without Flask request context.
@@ -123,9 +161,7 @@ def process_get_firmware(args):
         f.close()
         return '{}'.format(fw)
     else:
-        # Sanitize log output to avoid information disclosure
-        uid_preview = uid[:8] + "..." if len(uid) > 8 else uid
-        _log_warning(f"Machine type unknown for device {uid_preview} - cannot fetch firmware")
+        _log_warning(f"Machine type unknown for device {_preview_uid(uid)} - cannot fetch firmware")
         _log_warning("Device type configuration via /devices UX is required")
         # TODO: Error Processing?
         return '#F#'
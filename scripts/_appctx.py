@@ -0,0 +1,24 @@
+"""Shared Flask app bootstrap for the recipe import scripts.
+
+Importing this module puts the repository root on sys.path so `app` is importable.
+"""
+import os
+import sys
+from contextlib import contextmanager
+from functools import lru_cache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app  # noqa: E402
+
+
+@lru_cache(maxsize=1)
+def get_app():
+    """Create the app once per process; chained imports reuse it."""
+    return create_app(debug=False)
+
+
+@contextmanager
+def app_ctx():
+    app = get_app()
+    with app.app_context():
+        yield app
@@ -0,0 +1,24 @@
+"""Request pacing shared by the recipe fetch scripts."""
+import threading
+import time
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing request starts at least `interval` seconds apart.
+
+    Unlike a fixed sleep after every request, concurrent callers only wait when
+    the overall request rate would otherwise exceed 1 / interval.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
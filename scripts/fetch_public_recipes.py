@@ -3,24 +3,47 @@ import argparse
 import json
 import os
 import re
+import string
 import sys
-import time
+import zlib
+from collections import deque
+from html import unescape
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from urllib.parse import urljoin, urlparse
 
 import requests
-from bs4 import BeautifulSoup
+import urllib3
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+
+from _ratelimit import RateLimiter
 
 # Default entry URL for PicoBrew community recipes
 DEFAULT_START_URL = "https://www.picobrew.com/publicrecipes/publicrecipes"
 
+# Link discovery only needs <a href> nodes; skip building the rest of the tree
+_LINK_STRAINER = SoupStrainer("a", href=True)
+
+# Detail pages only need their <title>; a regex over the raw bytes avoids a tree walk
+_TITLE_RE = re.compile(rb"<title[^>]*>(.*?)</title>", re.I | re.S)
+
+# Requests are deliberately unverified (see fetch_all); silence the per-request warning once
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
 
 def log(msg: str):
     print(f"[fetch_public_recipes] {msg}", flush=True)
 
 
+# Maps every ASCII character outside [a-zA-Z0-9._-] to "_"
+_FILENAME_ALLOWED = set(string.ascii_letters + string.digits + "._-")
+_FILENAME_TRANS = str.maketrans({chr(c): "_" for c in range(128) if chr(c) not in _FILENAME_ALLOWED})
+
+
 def safe_filename(name: str) -> str:
-    return re.sub(r"[^a-zA-Z0-9._-]", "_", name)[:200]
+    # Non-ASCII characters become "?" (one per code point) and are then mapped to "_"
+    return name.encode("ascii", "replace").decode("ascii").translate(_FILENAME_TRANS)[:200]
 
 
 def is_same_domain(base: str, link: str) -> bool:
@@ -29,8 +52,7 @@ def is_same_domain(base: str, link: str) -> bool:
     return (lu.netloc == "" or lu.netloc == bu.netloc)
 
 
-def extract_links(html: str, base_url: str):
-    soup = BeautifulSoup(html, "html.parser")
+def extract_links(soup: BeautifulSoup, base_url: str):
     hrefs = []
     for a in soup.find_all("a", href=True):
         href = a["href"].strip()
@@ -46,58 +68,117 @@ def extract_links(html: str, base_url: str):
     return list(dict.fromkeys(hrefs))  # dedupe, preserve order
 
 
-def fetch_all(start_url: str, out_dir: Path, delay: float = 0.5, timeout: int = 20):
+def detail_slug(url: str):
+    """Return the output file slug for a recipe detail page, or None for listing pages."""
+    # Heuristics: contains keywords or specific structures; fall back to saving all under publicrecipes path
+    is_detail = any(s in url for s in ["/publicrecipes/recipe", "/publicrecipes/details"]) or ("/publicrecipes/" in url and url.rstrip("/") != DEFAULT_START_URL.rstrip("/"))
+    if not is_detail:
+        return None
+    # Derive filename from URL path and query (details?id=N pages share a path)
+    parsed = urlparse(url)
+    name = parsed.path.strip("/").replace("/", "_")
+    if parsed.query:
+        name = f"{name}_{parsed.query}"
+    slug = safe_filename(name)
+    return slug or f"recipe_{zlib.crc32(url.encode()):08x}"
+
+
+def extract_title(resp: requests.Response):
+    """Return the decoded <title> text of a response, or None if missing or it contains markup."""
+    m = _TITLE_RE.search(resp.content)
+    if not m:
+        return None
+    title = m.group(1).decode(resp.encoding or "utf-8", "replace")
+    if "<" in title:
+        return None
+    return unescape(title).strip()
+
+
+def fetch_page(session: requests.Session, url: str, slug, out_dir: Path, limiter: RateLimiter, timeout: int):
+    """Fetch a single page on a worker thread and save it as `slug` if one is given.
+
+    Returns (url, html, slug, title); html is None on failure, slug and title are None
+    when the page was not saved.
+    """
+    try:
+        limiter.wait()
+        log(f"GET {url}")
+        resp = session.get(url, timeout=timeout, verify=False)
+        if resp.status_code != 200:
+            log(f"WARN: status {resp.status_code} for {url}")
+            return url, None, None, None
+        html = resp.text
+        # Writing here overlaps disk I/O with other workers' requests and the parser
+        if not slug:
+            return url, html, None, None
+        (out_dir / f"{slug}.html").write_text(html, encoding="utf-8")
+        return url, html, slug, extract_title(resp) or slug
+    except Exception as e:
+        log(f"ERROR: {e} for {url}")
+        return url, None, None, None
+
+
+def fetch_all(start_url: str, out_dir: Path, delay: float = 0.1, timeout: int = 20, workers: int = 8):
+    # Site currently presents an expired certificate; fetch_page uses verify=False.
+    # Keep-alive connections are pooled per host (one per worker), so DNS and the
+    # TLS handshake are paid once per connection rather than once per page.
     session = requests.Session()
-    # Site currently presents an expired certificate; allow insecure with verify=False
-    verify = False
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(workers, 10))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    # Shared across workers: paces request starts instead of sleeping after every page
+    limiter = RateLimiter(delay)
 
     crawled = set()
-    to_visit = [start_url]
+    to_visit = deque([start_url])
+    queued = {start_url}
+    slugs = set()
     recipes = []
 
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    while to_visit:
-        url = to_visit.pop(0)
-        if url in crawled:
-            continue
-        crawled.add(url)
-
-        try:
-            log(f"GET {url}")
-            resp = session.get(url, timeout=timeout, verify=verify)
-            if resp.status_code != 200:
-                log(f"WARN: status {resp.status_code} for {url}")
-                continue
-            html = resp.text
-        except Exception as e:
-            log(f"ERROR: {e} for {url}")
-            continue
-
-        # Save page if it appears to be a recipe detail page (heuristic)
-        # Heuristics: contains keywords or specific structures; fall back to saving all under publicrecipes path
-        is_detail = any(s in url for s in ["/publicrecipes/recipe", "/publicrecipes/details"]) or ("/publicrecipes/" in url and url.rstrip("/") != DEFAULT_START_URL.rstrip("/"))
-        if is_detail:
-            # Derive filename from URL path
-            parsed = urlparse(url)
-            slug = safe_filename(parsed.path.strip("/").replace("/", "_"))
-            if not slug:
-                slug = f"recipe_{len(recipes)+1}"
-            html_path = out_dir / f"{slug}.html"
-            html_path.write_text(html, encoding="utf-8")
-            recipes.append({
-                "url": url,
-                "file": html_path.name,
-                "title": BeautifulSoup(html, "html.parser").title.string.strip() if BeautifulSoup(html, "html.parser").title else slug,
-            })
-
-        # Extract more links (pagination and details)
-        links = extract_links(html, url)
-        for link in links:
-            if link not in crawled and link not in to_visit:
-                to_visit.append(link)
-
-        time.sleep(delay)
+    # Workers fetch and save pages; link discovery, dedupe and the index stay on this thread
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        while to_visit or in_flight:
+            while to_visit and len(in_flight) < workers:
+                url = to_visit.popleft()
+                queued.discard(url)
+                crawled.add(url)
+                # Slugs are assigned here, never on workers, so no two pages share a file
+                slug = detail_slug(url)
+                if slug in slugs:
+                    slug = f"{slug}_{zlib.crc32(url.encode()):08x}"
+                if slug:
+                    slugs.add(slug)
+                in_flight.add(executor.submit(fetch_page, session, url, slug, out_dir, limiter, timeout))
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, html, slug, title = future.result()
+                if html is None:
+                    continue
+
+                if slug:
+                    recipes.append({
+                        "url": url,
+                        "file": f"{slug}.html",
+                        "title": title,
+                    })
+
+                # Extract more links (pagination and details)
+                soup = BeautifulSoup(html, "html.parser", parse_only=_LINK_STRAINER)
+                links = extract_links(soup, url)
+                # The tree is full of parent/child reference cycles; tear it down now
+                # instead of leaving each page's DOM for the cyclic GC on long crawls
+                soup.decompose()
+                for link in links:
+                    if link not in crawled and link not in queued:
+                        queued.add(link)
+                        to_visit.append(link)
 
     # Write index
     index = {
@@ -113,12 +194,13 @@ def main():
     parser = argparse.ArgumentParser(description="Fetch PicoBrew community public recipes")
     parser.add_argument("--start-url", default=DEFAULT_START_URL, help="Starting URL for community recipes")
     parser.add_argument("--out-dir", default=str(Path("app/recipes/public_html").resolve()), help="Output directory for saved HTML and index.json")
-    parser.add_argument("--delay", type=float, default=0.5, help="Delay between requests (seconds)")
+    parser.add_argument("--delay", type=float, default=0.1, help="Minimum interval between request starts (seconds)")
     parser.add_argument("--timeout", type=int, default=20, help="Request timeout (seconds)")
+    parser.add_argument("--workers", type=int, default=8, help="Number of concurrent fetch workers")
     args = parser.parse_args()
 
     out_dir = Path(args.out_dir)
-    fetch_all(args.start_url, out_dir, delay=args.delay, timeout=args.timeout)
+    fetch_all(args.start_url, out_dir, delay=args.delay, timeout=args.timeout, workers=args.workers)
 
 
 if __name__ == "__main__":
@@ -1,29 +1,47 @@
 #!/usr/bin/env python3
 import argparse
+import queue
 import sys
-import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import requests
-import os, sys
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from app import create_app
-from app.main.config import MachineType
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from _appctx import app_ctx
+from _ratelimit import RateLimiter
+from app.main.config import MachineType, recipe_path
 from app.main.recipe_import import ZSeriesDataSyncURI, ZSeriesMetaSyncURI, Z_AUTH_TOKEN
 from app.main.recipe_parser import ZSeriesRecipeImport
 from flask import current_app
 
+# The Z-series endpoints are addressed by IP and present an expired certificate, so
+# requests are deliberately unverified; silence the per-request warning once
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def fetch_list(session: requests.Session, token: str, kind: int, max_count: int, offset: int):
+# Built once and passed per request; the session's own headers are never mutated
+LIST_HEADERS = {"host": "www.picobrew.com", "Authorization": Z_AUTH_TOKEN, "Content-Type": "application/json"}
+DETAIL_HEADERS = {"host": "www.picobrew.com", "Authorization": Z_AUTH_TOKEN}
+
+# Listing pages requested concurrently when the catalog reports its TotalCount
+LIST_PREFETCH = 4
+
+
+def fetch_list(session: requests.Session, token: str, kind: int, max_count: int, offset: int,
+               headers: dict = None):
     uri = ZSeriesMetaSyncURI(token)
-    r = session.post(uri, verify=False, json={"Kind": kind, "MaxCount": max_count, "Offset": offset})
+    r = session.post(uri, headers=headers or LIST_HEADERS, verify=False, timeout=20,
+                     json={"Kind": kind, "MaxCount": max_count, "Offset": offset})
     if r.status_code != 200:
         raise RuntimeError(f"Failed list at offset {offset}: {r.status_code} {r.text}")
     return r.json()
 
 
-def fetch_detail(session: requests.Session, token: str, rid: str):
+def fetch_detail(session: requests.Session, token: str, rid: str, headers: dict = None):
     uri = ZSeriesDataSyncURI(token, rid)
-    r = session.get(uri, verify=False)
+    r = session.get(uri, headers=headers or DETAIL_HEADERS, verify=False, timeout=20)
     if r.status_code != 200:
         raise RuntimeError(f"Failed detail {rid}: {r.status_code} {r.text}")
     return r.json()
@@ -33,52 +51,155 @@ def main():
     parser = argparse.ArgumentParser(description="Fetch ALL Z-series recipes and import to local library")
     parser.add_argument("--token", required=True, help="Z-series token (Product ID)")
     parser.add_argument("--max", type=int, default=200, help="Page size per request (default 200)")
-    parser.add_argument("--sleep", type=float, default=0.1, help="Delay between requests")
+    parser.add_argument("--sleep", type=float, default=0.1, help="Minimum interval between request starts")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent detail fetches (default 8)")
     args = parser.parse_args()
 
-    app = create_app(debug=False)
-    with app.app_context():
+    with app_ctx():
+        # One pooled keep-alive session for every list/detail request. The pool holds
+        # exactly one connection per concurrent caller (detail workers, the lister and
+        # its prefetch pool) and blocks rather than opening throwaway extra connections.
+        # Every request carries its own token headers, so no session state is shared
         session = requests.Session()
-        session.headers = requests.structures.CaseInsensitiveDict({
-            "host": "www.picobrew.com",
-            "Authorization": Z_AUTH_TOKEN,
-            "Content-Type": "application/json",
-        })
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=args.workers + LIST_PREFETCH + 1, pool_block=True,
+                              max_retries=Retry(total=3, backoff_factor=0.3))
+        session.mount("https://", adapter)
 
+        limiter = RateLimiter(args.sleep)
+
+        def throttled(fn, *fn_args, **fn_kwargs):
+            limiter.wait()
+            return fn(*fn_args, **fn_kwargs)
+
+        rid_queue = queue.Queue(maxsize=args.max)
+        detail_queue = queue.Queue()
         total = 0
-        offset = 0
         imported = 0
-        seen_ids = set()
-        while True:
+        skipped = 0
+        # ZSeriesRecipeImport never overwrites an existing recipe file, so snapshot the
+        # library once and skip the detail fetch + import for recipes already on disk
+        existing = {p.stem for p in recipe_path(MachineType.ZSERIES).glob("*.json")}
+
+        def list_page(offset):
+            """Fetch one listing page; returns None (after logging) on failure."""
             try:
-                listing = fetch_list(session, args.token, kind=1, max_count=args.max, offset=offset)
+                return throttled(fetch_list, session, args.token, kind=1, max_count=args.max, offset=offset)
             except Exception as e:
                 print(f"[zseries-all] list error at offset {offset}: {e}")
-                break
-            recipes = listing.get("Recipes") or []
-            if not recipes:
-                break
-            print(f"[zseries-all] batch offset={offset} count={len(recipes)}")
-            for rec in recipes:
-                rid = rec.get("ID")
-                if rid is None or rid in seen_ids:
-                    continue
-                seen_ids.add(rid)
+                return None
+
+        def listing_pages():
+            """Yield (offset, recipes) for each listing page, in order, until an empty page.
+
+            When the first page reports TotalCount, up to LIST_PREFETCH of the following
+            pages are kept in flight rather than one round trip at a time. A failed page
+            drops the prefetch and the serial walk resumes from its offset; paging also
+            continues serially past the reported total in case the catalog grew meanwhile.
+            """
+            offset = 0
+            listing = list_page(offset)
+            recipes = (listing or {}).get("Recipes") or []
+            total_count = (listing or {}).get("TotalCount")
+            if recipes and isinstance(total_count, int):
+                offsets = iter(range(len(recipes), total_count, len(recipes)))
+                pager = ThreadPoolExecutor(max_workers=LIST_PREFETCH)
+                window = deque()
+
+                def prefetch():
+                    page_offset = next(offsets, None)
+                    if page_offset is not None:
+                        window.append((page_offset, pager.submit(list_page, page_offset)))
+
+                try:
+                    for _ in range(LIST_PREFETCH):
+                        prefetch()
+                    yield offset, recipes
+                    offset += len(recipes)
+                    while window:
+                        page_offset, future = window.popleft()
+                        listing = future.result()
+                        if listing is None:
+                            break
+                        recipes = listing.get("Recipes") or []
+                        if not recipes:
+                            return
+                        prefetch()
+                        yield page_offset, recipes
+                        offset = page_offset + len(recipes)
+                finally:
+                    # Don't fetch pages nobody will read (cancel_futures needs 3.9)
+                    for _, future in window:
+                        future.cancel()
+                    pager.shutdown(wait=True)
+                listing = list_page(offset)
+                recipes = (listing or {}).get("Recipes") or []
+            while recipes:
+                yield offset, recipes
+                offset += len(recipes)
+                listing = list_page(offset)
+                recipes = (listing or {}).get("Recipes") or []
+
+        def lister():
+            """Walk listing pages and hand unseen recipe IDs to the detail workers.
+
+            Runs ahead of the workers so the next page is requested while the
+            current page's details are still being fetched.
+            """
+            nonlocal total, skipped
+            seen_ids = set()
+            try:
+                for offset, recipes in listing_pages():
+                    print(f"[zseries-all] batch offset={offset} count={len(recipes)}")
+                    for rec in recipes:
+                        rid = rec.get("ID")
+                        if rid is None or rid in seen_ids:
+                            continue
+                        seen_ids.add(rid)
+                        if (rec.get("Name") or "").replace(" ", "_") in existing:
+                            skipped += 1
+                            continue
+                        rid_queue.put(rid)
+                    total += len(recipes)
+            finally:
+                # One sentinel per worker drains the pool
+                for _ in range(args.workers):
+                    rid_queue.put(None)
+
+        def detail_worker():
+            while True:
+                rid = rid_queue.get()
+                if rid is None:
+                    detail_queue.put(None)
+                    return
+                try:
+                    detail_queue.put((rid, throttled(fetch_detail, session, args.token, str(rid)), None))
+                except Exception as e:
+                    detail_queue.put((rid, None, e))
+
+        threads = [threading.Thread(target=lister, daemon=True)]
+        threads += [threading.Thread(target=detail_worker, daemon=True) for _ in range(args.workers)]
+        for t in threads:
+            t.start()
+
+        # Imports stay on this thread (it owns the app context) so file writes are serialized
+        running = args.workers
+        while running:
+            item = detail_queue.get()
+            if item is None:
+                running -= 1
+                continue
+            rid, detail, error = item
+            if error is None:
                 try:
-                    session.headers = requests.structures.CaseInsensitiveDict({
-                        "host": "www.picobrew.com",
-                        "Authorization": Z_AUTH_TOKEN,
-                    })
-                    detail = fetch_detail(session, args.token, str(rid))
                     ZSeriesRecipeImport(detail)
                     imported += 1
+                    continue
                 except Exception as e:
-                    print(f"[zseries-all] detail error for {rid}: {e}")
-                time.sleep(args.sleep)
-            total += len(recipes)
-            offset += len(recipes)
-            time.sleep(args.sleep)
-        print(f"[zseries-all] done: listed={total} imported={imported}")
+                    error = e
+            print(f"[zseries-all] detail error for {rid}: {error}")
+        for t in threads:
+            t.join()
+        print(f"[zseries-all] done: listed={total} imported={imported} skipped={skipped}")
 
 
 if __name__ == "__main__":
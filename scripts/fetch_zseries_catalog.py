@@ -1,9 +1,7 @@
 #!/usr/bin/env python3
 import argparse
 import sys
-import os, sys
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from app import create_app
+from _appctx import app_ctx
 from app.main.recipe_import import import_recipes_z
 
 
@@ -12,8 +10,7 @@ def main():
     parser.add_argument("--token", required=True, help="Z-series token (Product ID)")
     args = parser.parse_args()
 
-    app = create_app(debug=False)
-    with app.app_context():
+    with app_ctx():
         import_recipes_z(args.token)
         print("Z-series catalog import completed.")
 
@@ -1,8 +1,6 @@
 #!/usr/bin/env python3
 import argparse
-import os, sys
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from app import create_app
+from _appctx import app_ctx
 from app.main.config import MachineType
 from app.main.recipe_import import import_recipes
 
@@ -13,8 +11,7 @@ def main():
     parser.add_argument("--rfid", required=True, help="PicoPak RFID (14-char) to import")
     args = parser.parse_args()
 
-    app = create_app(debug=False)
-    with app.app_context():
+    with app_ctx():
         import_recipes(args.uid, None, args.rfid, MachineType.PICOBREW)
         print("Pico import completed.")
 
@@ -6,10 +6,10 @@ This script simulates multiple PicoBrew devices connecting simultaneously
 to test our race condition fixes.
 
 Usage:
-    python3 scripts/test_race_conditions.py [server_url]
+    python3 scripts/test_race_conditions.py [server_url] [num_devices]
 
 Example:
-    python3 scripts/test_race_conditions.py http://localhost:80
+    python3 scripts/test_race_conditions.py http://localhost:80 100
 """
 
 import threading
@@ -17,20 +17,39 @@ import time
 import requests
 import sys
 import random
+from concurrent.futures import ThreadPoolExecutor
 
-def test_device_connection(base_url, device_id, results, lock):
-    """Test a single device connection"""
+# Each worker thread plays one device, with its own keep-alive session
+_thread_local = threading.local()
+_sessions = []
+
+def get_session():
+    """Return the session of the device running on this thread"""
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = _thread_local.session = requests.Session()
+        _sessions.append(session)
+    return session
+
+def close_sessions():
+    """Close every device session once its executor has finished"""
+    while _sessions:
+        _sessions.pop().close()
+
+def test_device_connection(base_url, device_id):
+    """Test a single device connection and return its result"""
     try:
+        session = get_session()
         print(f"  Device {device_id[:8]}... connecting...")
         
         # Register device
         register_url = f"{base_url}/API/pico/register?uid={device_id}"
-        response = requests.get(register_url, timeout=5)
+        response = session.get(register_url, timeout=5)
         
         if response.status_code == 200:
             # Get session
             session_url = f"{base_url}/API/pico/getSession?uid={device_id}&sesType=0"
-            response = requests.get(session_url, timeout=5)
+            response = session.get(session_url, timeout=5)
             
             if response.status_code == 200:
                 # Send log data
@@ -47,50 +66,56 @@ def test_device_connection(base_url, device_id, results, lock):
                     'shutScale': 0.0
                 }
                 
-                query_string = '&'.join([f"{k}={v}" for k, v in log_data.items()])
-                log_response = requests.get(f"{log_url}?{query_string}", timeout=5)
+                log_response = session.get(log_url, params=log_data, timeout=5)
                 
-                with lock:
-                    results.append({
-                        'device_id': device_id,
-                        'success': True,
-                        'status': 'OK'
-                    })
+                result = {
+                    'device_id': device_id,
+                    'success': True,
+                    'status': 'OK'
+                }
                 print(f"  Device {device_id[:8]}... SUCCESS")
             else:
-                with lock:
-                    results.append({
-                        'device_id': device_id,
-                        'success': False,
-                        'status': f'Session failed: {response.status_code}'
-                    })
-                print(f"  Device {device_id[:8]}... SESSION FAILED")
-        else:
-            with lock:
-                results.append({
+                result = {
                     'device_id': device_id,
                     'success': False,
-                    'status': f'Registration failed: {response.status_code}'
-                })
+                    'status': f'Session failed: {response.status_code}'
+                }
+                print(f"  Device {device_id[:8]}... SESSION FAILED")
+        else:
+            result = {
+                'device_id': device_id,
+                'success': False,
+                'status': f'Registration failed: {response.status_code}'
+            }
             print(f"  Device {device_id[:8]}... REGISTRATION FAILED")
             
     except Exception as e:
-        with lock:
-            results.append({
-                'device_id': device_id,
-                'success': False,
-                'status': f'Error: {str(e)}'
-            })
+        result = {
+            'device_id': device_id,
+            'success': False,
+            'status': f'Error: {str(e)}'
+        }
         print(f"  Device {device_id[:8]}... ERROR: {e}")
+    return result
 
 def main():
     # Default server URL
     base_url = "http://localhost:80"
-    
+    num_devices = 10
+
     # Allow command line override
     if len(sys.argv) > 1:
         base_url = sys.argv[1]
-    
+    if len(sys.argv) > 2:
+        try:
+            num_devices = int(sys.argv[2])
+        except ValueError:
+            num_devices = 0
+        if num_devices < 1:
+            print(f"Error: num_devices must be a positive integer, got {sys.argv[2]!r}")
+            print("Usage: python3 scripts/test_race_conditions.py [server_url] [num_devices]")
+            return 1
+
     print(f"Testing PicoBrew Server Race Conditions")
     print(f"Server: {base_url}")
     print("=" * 50)
@@ -110,38 +135,19 @@ def main():
         return 1
     
     # Generate test device IDs
-    num_devices = 10
-    device_ids = [
-        f"test_device_{i:02d}_" + "0" * (32 - len(f"test_device_{i:02d}_"))
-        for i in range(num_devices)
-    ]
+    device_ids = [f"test_device_{i:02d}_".ljust(32, "0") for i in range(num_devices)]
     
     print(f"Testing {num_devices} devices connecting simultaneously...")
     print()
     
     # Test 1: Simultaneous connections
     print("Test 1: All devices connect at the same time")
-    results = []
-    lock = threading.Lock()
-    
-    # Start all threads simultaneously
-    threads = []
-    for device_id in device_ids:
-        thread = threading.Thread(
-            target=test_device_connection,
-            args=(base_url, device_id, results, lock)
-        )
-        threads.append(thread)
-    
     start_time = time.time()
     
-    # Start all threads
-    for thread in threads:
-        thread.start()
-    
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
+    # One pooled worker per device; each returns its own result, so no shared list or lock
+    with ThreadPoolExecutor(max_workers=num_devices) as executor:
+        results = list(executor.map(lambda device_id: test_device_connection(base_url, device_id), device_ids))
+    close_sessions()
     
     end_time = time.time()
     
@@ -175,11 +181,11 @@ def main():
         
         # Try to access the same device from multiple threads
         test_device = device_ids[0]
-        corruption_results = []
-        corruption_lock = threading.Lock()
         
         def test_data_integrity(thread_id):
+            corruption_results = []
             try:
+                session = get_session()
                 # Send multiple log entries rapidly
                 for i in range(5):
                     log_url = f"{base_url}/API/pico/log"
@@ -195,45 +201,38 @@ def main():
                         'shutScale': 0.0
                     }
                     
-                    query_string = '&'.join([f"{k}={v}" for k, v in log_data.items()])
-                    response = requests.get(f"{log_url}?{query_string}", timeout=5)
+                    response = session.get(log_url, params=log_data, timeout=5)
                     
                     if response.status_code == 200:
-                        with corruption_lock:
-                            corruption_results.append({
-                                'thread_id': thread_id,
-                                'step': i,
-                                'success': True
-                            })
+                        corruption_results.append({
+                            'thread_id': thread_id,
+                            'step': i,
+                            'success': True
+                        })
                     else:
-                        with corruption_lock:
-                            corruption_results.append({
-                                'thread_id': thread_id,
-                                'step': i,
-                                'success': False,
-                                'status_code': response.status_code
-                            })
+                        corruption_results.append({
+                            'thread_id': thread_id,
+                            'step': i,
+                            'success': False,
+                            'status_code': response.status_code
+                        })
                     
                     time.sleep(0.01)  # Small delay
                     
             except Exception as e:
-                with corruption_lock:
-                    corruption_results.append({
-                        'thread_id': thread_id,
-                        'step': 0,
-                        'success': False,
-                        'error': str(e)
-                    })
+                corruption_results.append({
+                    'thread_id': thread_id,
+                    'step': 0,
+                    'success': False,
+                    'error': str(e)
+                })
+            return corruption_results
         
         # Start multiple threads testing data integrity
-        integrity_threads = []
-        for i in range(3):
-            thread = threading.Thread(target=test_data_integrity, args=(i,))
-            integrity_threads.append(thread)
-            thread.start()
-        
-        for thread in integrity_threads:
-            thread.join()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            corruption_results = [r for thread_results in executor.map(test_data_integrity, range(3))
+                                  for r in thread_results]
+        close_sessions()
         
         corruption_successful = sum(1 for r in corruption_results if r['success'])
         print(f"Data integrity test: {corruption_successful}/{len(corruption_results)} successful")
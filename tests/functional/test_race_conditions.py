@@ -2,13 +2,8 @@ import threading
 import time
 import requests
 import json
-import sys
-import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Add the app directory to the path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..'))
-
 class TestRaceConditions:
     """Test race conditions with multiple simulated PicoBrew devices"""
     
@@ -16,20 +11,36 @@ class TestRaceConditions:
         self.base_url = base_url
         self.test_results = []
         self.errors = []
+        # Simulated devices don't share connections, so neither do worker threads
+        self._local = threading.local()
+        self._sessions = []
+
+    def _session(self):
+        """requests.Session owned by the worker thread calling this"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            self._sessions.append(session)
+        return session
+
+    def _close_sessions(self):
+        while self._sessions:
+            self._sessions.pop().close()
     
     def simulate_device_connection(self, device_id, delay=0):
         """Simulate a PicoBrew device connecting and registering"""
         try:
             time.sleep(delay)  # Stagger connections to test race conditions
+            session = self._session()
             
             # Step 1: Register device
             register_url = f"{self.base_url}/API/pico/register?uid={device_id}"
-            response = requests.get(register_url, timeout=10)
+            response = session.get(register_url, timeout=10)
             
             if response.status_code == 200:
                 # Step 2: Try to create a session
                 session_url = f"{self.base_url}/API/pico/getSession?uid={device_id}&sesType=0"
-                response = requests.get(session_url, timeout=10)
+                response = session.get(session_url, timeout=10)
                 
                 if response.status_code == 200:
                     # Step 3: Send some log data
@@ -46,9 +57,7 @@ class TestRaceConditions:
                         'shutScale': 0.0
                     }
                     
-                    # Convert to query string
-                    query_string = '&'.join([f"{k}={v}" for k, v in log_data.items()])
-                    log_response = requests.get(f"{log_url}?{query_string}", timeout=10)
+                    log_response = session.get(log_url, params=log_data, timeout=10)
                     
                     return {
                         'device_id': device_id,
@@ -88,8 +97,7 @@ class TestRaceConditions:
         print(f"Testing concurrent connections with {num_devices} devices...")
         
         # Generate unique device IDs
-        device_ids = [f"test_device_{i:02d}_" + "0" * (32 - len(f"test_device_{i:02d}_")) 
-                     for i in range(num_devices)]
+        device_ids = [f"test_device_{i:02d}_".ljust(32, "0") for i in range(num_devices)]
         
         # Test 1: All devices connect at exactly the same time
         print("Test 1: Simultaneous connections...")
@@ -126,8 +134,9 @@ class TestRaceConditions:
                 
                 staggered_successful = sum(1 for r in staggered_results if r['log_success'])
                 print(f"Staggered results: {staggered_successful}/{num_devices} successful logs")
-            
-            return results, staggered_results
+        self._close_sessions()
+        
+        return results, staggered_results
     
     def test_session_data_integrity(self):
         """Test that session data remains consistent under concurrent access"""
@@ -137,6 +146,7 @@ class TestRaceConditions:
         
         # Create multiple threads that send log data simultaneously
         def send_log_data(thread_id, count):
+            session = self._session()
             results = []
             for i in range(count):
                 try:
@@ -153,8 +163,7 @@ class TestRaceConditions:
                         'shutScale': 0.0
                     }
                     
-                    query_string = '&'.join([f"{k}={v}" for k, v in log_data.items()])
-                    response = requests.get(f"{log_url}?{query_string}", timeout=10)
+                    response = session.get(log_url, params=log_data, timeout=10)
                     
                     results.append({
                         'thread_id': thread_id,
@@ -186,6 +195,7 @@ class TestRaceConditions:
             for future in as_completed(futures):
                 thread_results = future.result()
                 all_results.extend(thread_results)
+        self._close_sessions()
         
         # Check results
         successful_logs = sum(1 for r in all_results if r['success'])
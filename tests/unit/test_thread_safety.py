@@ -1,23 +1,30 @@
+import queue
 import threading
-import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor, wait
 from unittest.mock import patch, MagicMock
-import sys
-import os
 
-# Add the app directory to the path so we can import our modules
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..'))
-
-from app.main.routes_pico_api import get_session_lock, session_locks, session_locks_lock
+from app.main.routes_pico_api import _MAX_LOCKS, get_session_lock, session_lock_shard, session_lock_shards
 from app.main.session_parser import session_restore_lock
 
 
 class TestThreadSafety(unittest.TestCase):
     """Test thread safety of session management functions"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Share one worker pool across tests instead of spawning threads per test"""
+        cls.pool = ThreadPoolExecutor(max_workers=16)
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+    
     def setUp(self):
         """Clear session locks before each test"""
-        session_locks.clear()
+        for recent_locks, live_locks, _ in session_lock_shards:
+            recent_locks.clear()
+            live_locks.clear()
     
     def test_get_session_lock_creates_unique_locks(self):
         """Test that different UIDs get different locks"""
@@ -28,8 +35,8 @@ class TestThreadSafety(unittest.TestCase):
         lock2 = get_session_lock(uid2)
         
         self.assertIsNot(lock1, lock2)
-        self.assertIn(uid1, session_locks)
-        self.assertIn(uid2, session_locks)
+        self.assertIn(uid1, session_lock_shard(uid1)[0])
+        self.assertIn(uid2, session_lock_shard(uid2)[0])
     
     def test_get_session_lock_reuses_existing_locks(self):
         """Test that the same UID always gets the same lock"""
@@ -39,36 +46,72 @@ class TestThreadSafety(unittest.TestCase):
         lock2 = get_session_lock(uid)
         
         self.assertIs(lock1, lock2)
-        self.assertEqual(len(session_locks), 1)
+        self.assertEqual(sum(len(recent_locks) for recent_locks, _, _ in session_lock_shards), 1)
+    
+    def test_session_locks_are_bounded(self):
+        """Test that idle locks are evicted once the lock table is full, referenced ones are kept"""
+        held_uid = "12345678901234567890123456789012"
+        # Fetched but not yet acquired: eviction must not hand this lock to another UID
+        held = get_session_lock(held_uid)
+        for i in range(2 * _MAX_LOCKS):
+            get_session_lock(f"device_{i:026d}")
+        
+        self.assertLessEqual(sum(len(recent_locks) for recent_locks, _, _ in session_lock_shards), _MAX_LOCKS)
+        self.assertIs(get_session_lock(held_uid), held)
+    
+    def test_evicted_session_locks_are_reclaimed(self):
+        """Test that an evicted lock stays live while referenced and is dropped afterwards"""
+        uid = "12345678901234567890123456789012"
+        recent_locks, live_locks, _ = session_lock_shard(uid)
+        
+        lock = get_session_lock(uid)
+        for i in range(2 * _MAX_LOCKS):
+            get_session_lock(f"device_{i:026d}")
+        self.assertNotIn(uid, recent_locks)
+        self.assertIs(live_locks.get(uid), lock)
+        
+        del lock
+        self.assertNotIn(uid, live_locks)
     
     def test_session_locks_are_thread_safe(self):
         """Test that lock creation is thread-safe"""
         uid = "12345678901234567890123456789012"
-        results = []
-        errors = []
+        results = queue.SimpleQueue()
+        errors = queue.SimpleQueue()
+        
+        # Two workers are enough to hit the race; rerun it from an empty shard each round
+        rounds = 200
+        recent_locks, live_locks, _ = session_lock_shard(uid)
+        barrier = threading.Barrier(2)
         
-        def create_lock():
+        def create_locks():
             try:
-                lock = get_session_lock(uid)
-                results.append(lock)
+                for i in range(rounds):
+                    barrier.wait(timeout=1.0)
+                    results.put((i, get_session_lock(uid)))
+                    # Once both workers are done, one of them forgets the lock for the next round
+                    if barrier.wait(timeout=1.0) == 0:
+                        recent_locks.pop(uid, None)
+                        live_locks.pop(uid, None)
             except Exception as e:
-                errors.append(e)
+                errors.put(e)
         
-        # Create multiple threads that try to get the same lock
-        threads = []
-        for _ in range(10):
-            thread = threading.Thread(target=create_lock)
-            threads.append(thread)
-            thread.start()
+        futures = [self.pool.submit(create_locks) for _ in range(2)]
         
-        # Wait for all threads to complete
-        for thread in threads:
-            thread.join()
+        # Wait for both workers to complete
+        wait(futures)
+        results = [results.get_nowait() for _ in range(results.qsize())]
+        errors = [errors.get_nowait() for _ in range(errors.qsize())]
         
-        # Should have no errors and all locks should be the same
+        # Should have no errors and both workers should get the same lock in every round
         self.assertEqual(len(errors), 0)
-        self.assertEqual(len(results), 10)
-        self.assertEqual(len(set(results)), 1)  # All locks should be the same object
+        self.assertEqual(len(results), 2 * rounds)
+        locks_by_round = {}
+        for i, lock in results:
+            locks_by_round.setdefault(i, set()).add(id(lock))
+        self.assertTrue(all(len(ids) == 1 for ids in locks_by_round.values()))
+        # and every round should have raced for a fresh lock
+        self.assertEqual(len({id(lock) for _, lock in results}), rounds)
     
     def test_session_restore_lock_exists(self):
         """Test that the session restore lock exists and is a threading.Lock"""
@@ -80,54 +123,55 @@ class TestThreadSafety(unittest.TestCase):
         uid1 = "11111111111111111111111111111111"
         uid2 = "22222222222222222222222222222222"
         
-        results = []
-        errors = []
+        results = queue.SimpleQueue()
+        errors = queue.SimpleQueue()
+        # Both critical sections must be entered at once to get past the barrier;
+        # if the UIDs shared a lock the wait would time out
+        barrier = threading.Barrier(2)
         
         def operation1():
             """Simulate session operations for UID1"""
             try:
                 lock = get_session_lock(uid1)
                 with lock:
-                    time.sleep(0.1)  # Simulate some work
-                    results.append(f"uid1_completed")
+                    barrier.wait(timeout=1.0)
+                    results.put(f"uid1_completed")
             except Exception as e:
-                errors.append(f"uid1_error: {e}")
+                errors.put(f"uid1_error: {e}")
         
         def operation2():
             """Simulate session operations for UID2"""
             try:
                 lock = get_session_lock(uid2)
                 with lock:
-                    time.sleep(0.1)  # Simulate some work
-                    results.append(f"uid2_completed")
+                    barrier.wait(timeout=1.0)
+                    results.put(f"uid2_completed")
             except Exception as e:
-                errors.append(f"uid2_error: {e}")
+                errors.put(f"uid2_error: {e}")
         
         # Run operations concurrently
-        thread1 = threading.Thread(target=operation1)
-        thread2 = threading.Thread(target=operation2)
-        
-        start_time = time.time()
-        thread1.start()
-        thread2.start()
-        
-        thread1.join()
-        thread2.join()
-        end_time = time.time()
+        futures = [self.pool.submit(operation1), self.pool.submit(operation2)]
+        wait(futures)
+        results = [results.get_nowait() for _ in range(results.qsize())]
+        errors = [errors.get_nowait() for _ in range(errors.qsize())]
         
         # Both operations should complete without errors
         self.assertEqual(len(errors), 0)
         self.assertEqual(len(results), 2)
         self.assertIn("uid1_completed", results)
         self.assertIn("uid2_completed", results)
-        
-        # Operations should run concurrently (total time < sum of individual times)
-        self.assertLess(end_time - start_time, 0.15)  # Should be ~0.1s, not 0.2s
 
 
 class TestInformationDisclosure(unittest.TestCase):
     """Test that sensitive information is not disclosed in logs"""
     
+    def test_preview_uid_truncates(self):
+        """Test that log previews never carry a full device UID"""
+        from app.main.routes_pico_api import _preview_uid
+        
+        self.assertEqual(_preview_uid('12345678901234567890123456789012'), '12345678...')
+        self.assertEqual(_preview_uid('12345678'), '<short-uid>')
+    
     @patch('app.main.routes_pico_api.current_app.logger.warning')
     def test_firmware_error_log_sanitization(self, mock_logger):
         """Test that firmware error logs don't expose session data"""